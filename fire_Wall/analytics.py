@@ -0,0 +1,106 @@
+# Network Log Analytics Store
+# Columnar DuckDB copy of network_logs so analytical scans stay off the live
+# SQLite database. Run this script periodically (e.g. nightly) to sync it.
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Optional, Tuple
+import duckdb
+import numpy as np
+import pandas as pd
+from schema import DATABASE
+
+SQLITE_DATABASE = DATABASE
+ANALYTICS_DATABASE = 'analytics.duckdb'
+
+# Latest synced row, and the same row looked up in SQLite by rowid
+SYNCED_ROW_SQL = "SELECT id, app_name, bytes_sent, bytes_received FROM logs ORDER BY id DESC LIMIT 1"
+SOURCE_ROW_SQL = "SELECT rowid, app_name, bytes_sent, bytes_received FROM network_logs WHERE rowid = ?"
+
+def _epoch_ms(value) -> Optional[int]:
+    """Normalize a network_logs timestamp to epoch milliseconds (None if unparseable)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    # Rows written before timestamps were stored as integers hold datetime strings
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def _synced_state(duck, sqlite_conn) -> Tuple[int, bool]:
+    """Return the last synced rowid and whether SQLite still holds that same row"""
+    synced = duck.execute(SYNCED_ROW_SQL).fetchone()
+    if synced is None:
+        return 0, True
+
+    # Rowids restart after network_logs is cleared, so compare the row itself
+    source = sqlite_conn.execute(SOURCE_ROW_SQL, (synced[0],)).fetchone()
+    return synced[0], source is not None and tuple(source) == tuple(synced)
+
+def sync_logs(sqlite_path: str = SQLITE_DATABASE,
+              analytics_path: str = ANALYTICS_DATABASE) -> int:
+    """Copy network logs added since the last sync into DuckDB, returning the row count"""
+    duck = duckdb.connect(analytics_path)
+    sqlite_conn = sqlite3.connect(sqlite_path, timeout=5)
+    try:
+        duck.execute('''
+            CREATE TABLE IF NOT EXISTS logs (
+                id BIGINT,  -- network_logs rowid (older databases have TEXT ids)
+                app_name VARCHAR,
+                timestamp BIGINT,
+                bytes_sent BIGINT,
+                bytes_received BIGINT
+            )
+        ''')
+
+        last_id, in_sync = _synced_state(duck, sqlite_conn)
+
+        # network_logs was cleared since the last sync, so start over
+        if not in_sync:
+            duck.execute("DELETE FROM logs")
+            last_id = 0
+
+        df = pd.read_sql(
+            "SELECT rowid AS id, app_name, timestamp, bytes_sent, bytes_received "
+            "FROM network_logs WHERE rowid > ? ORDER BY rowid",
+            sqlite_conn, params=[last_id]
+        )
+        df['timestamp'] = df['timestamp'].map(_epoch_ms).astype('Int64')
+        duck.execute("INSERT INTO logs SELECT * FROM df")
+        return len(df)
+    finally:
+        sqlite_conn.close()
+        duck.close()
+
+def sample_features(limit: int, max_lag: float, sqlite_conn,
+                    analytics_path: str = ANALYTICS_DATABASE) -> Optional[np.ndarray]:
+    """Random (bytes_sent, bytes_received) sample, or None if the store is missing or stale"""
+    if not os.path.exists(analytics_path):
+        return None
+
+    try:
+        duck = duckdb.connect(analytics_path, read_only=True)
+    except duckdb.Error:
+        return None  # Locked by a running sync
+
+    try:
+        synced_id, in_sync = _synced_state(duck, sqlite_conn)
+        max_id = sqlite_conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM network_logs").fetchone()[0]
+
+        # Logs cleared since the last sync, or the store is too far behind
+        if not in_sync or synced_id < max_id * (1 - max_lag):
+            return None
+
+        features = np.array(duck.execute(
+            f"SELECT bytes_sent, bytes_received FROM logs USING SAMPLE reservoir({int(limit)} ROWS)"
+        ).fetchall(), dtype=np.float32).reshape(-1, 2)
+        return features if len(features) else None
+    except duckdb.Error:
+        return None
+    finally:
+        duck.close()
+
+if __name__ == '__main__':
+    copied = sync_logs()
+    print(f"Synced {copied} network logs to {ANALYTICS_DATABASE}")
@@ -2,6 +2,7 @@ import sqlite3
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from joblib import parallel_backend
 import matplotlib.pyplot as plt
 
 def debug_anomaly_detection():
@@ -9,46 +10,53 @@ def debug_anomaly_detection():
     # Connect to database
     conn = sqlite3.connect('firewall_policies.db')
     
-    # Read network logs
-    df = pd.read_sql_query("SELECT * FROM network_logs", conn)
+    # Read only the columns used for fitting and reporting
+    df = pd.read_sql_query(
+        "SELECT app_name, destination, bytes_sent, bytes_received FROM network_logs", conn
+    )
     conn.close()
 
     # Extract features
-    features = df[['bytes_sent', 'bytes_received']].values
+    # float32 matches IsolationForest's internal dtype, avoiding a silent copy
+    features = np.ascontiguousarray(df[['bytes_sent', 'bytes_received']].to_numpy(dtype=np.float32))
 
     # Anomaly Detection
     clf = IsolationForest(
         contamination=0.1,  # 10% of data considered anomalous
-        random_state=42
+        random_state=42,
+        n_jobs=-1  # Build and score trees on all cores
     )
     
     # Fit and predict
-    predictions = clf.fit_predict(features)
+    with parallel_backend('threading', n_jobs=-1):
+        predictions = clf.fit_predict(features)
     
-    # Mark anomalies
-    df['is_anomaly'] = predictions == -1
+    # Mark anomalies once and reuse the mask as plain NumPy arrays
+    mask = predictions == -1
+    bytes_sent = df['bytes_sent'].to_numpy()
+    bytes_received = df['bytes_received'].to_numpy()
 
     # Print Detailed Anomaly Information
     print("\n--- Anomaly Detection Report ---")
     print(f"Total Logs: {len(df)}")
-    print(f"Anomalous Logs: {sum(df['is_anomaly'])}")
+    print(f"Anomalous Logs: {int(mask.sum())}")
     
     # Print Anomalous Entries
     print("\nAnomalous Log Details:")
-    anomalies = df[df['is_anomaly']]
-    print(anomalies[['app_name', 'destination', 'bytes_sent', 'bytes_received']])
+    anomalies = df.iloc[mask][['app_name', 'destination', 'bytes_sent', 'bytes_received']]
+    print(anomalies)
 
     # Visualization
     plt.figure(figsize=(10, 6))
     plt.scatter(
-        df[~df['is_anomaly']]['bytes_sent'], 
-        df[~df['is_anomaly']]['bytes_received'], 
+        bytes_sent[~mask], 
+        bytes_received[~mask], 
         c='blue', 
         label='Normal'
     )
     plt.scatter(
-        df[df['is_anomaly']]['bytes_sent'], 
-        df[df['is_anomaly']]['bytes_received'], 
+        bytes_sent[mask], 
+        bytes_received[mask], 
         c='red', 
         label='Anomaly'
     )
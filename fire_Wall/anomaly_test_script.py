@@ -1,44 +1,47 @@
 import sqlite3
 import random
-from datetime import datetime
-import uuid
+import time
 
 def generate_test_logs():
     """Generate synthetic network logs to test anomaly detection"""
     conn = sqlite3.connect('firewall_policies.db')
     cursor = conn.cursor()
 
+    timestamp = int(time.time() * 1000)  # UNIX epoch milliseconds
+
     # Normal traffic logs
-    for _ in range(50):
-        cursor.execute('''
-            INSERT INTO network_logs 
-            (id, app_name, timestamp, destination, protocol, bytes_sent, bytes_received)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            str(uuid.uuid4()),
+    normal_rows = [
+        (
             'chrome.exe',
-            str(datetime.now()),
+            timestamp,
             f'192.168.1.{random.randint(1,255)}',
             'TCP',
             random.randint(100, 5000),  # Normal bytes sent
             random.randint(100, 5000)   # Normal bytes received
-        ))
+        )
+        for _ in range(50)
+    ]
 
     # Anomalous traffic logs
-    for _ in range(5):
-        cursor.execute('''
-            INSERT INTO network_logs 
-            (id, app_name, timestamp, destination, protocol, bytes_sent, bytes_received)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            str(uuid.uuid4()),
+    anom_rows = [
+        (
             'suspicious_app.exe',
-            str(datetime.now()),
+            timestamp,
             f'unknown_host_{random.randint(1,100)}',
             'UDP',
             random.randint(50000, 500000),  # Unusually high bytes sent
             random.randint(50000, 500000)   # Unusually high bytes received
-        ))
+        )
+        for _ in range(5)
+    ]
+
+    # Insert everything in a single transaction (one commit instead of one per row)
+    cursor.execute('BEGIN')
+    cursor.executemany('''
+        INSERT INTO network_logs 
+        (app_name, timestamp, destination, protocol, bytes_sent, bytes_received)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', normal_rows + anom_rows)
 
     conn.commit()
     conn.close()
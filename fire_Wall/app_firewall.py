@@ -2,22 +2,28 @@
 
 import os
 import json
+import time
 import uuid
+import atexit
 import logging
-import hashlib
 import psutil
 import sqlite3
 import threading
 import subprocess
-from typing import Dict, List, Any
-from flask import Flask, request, jsonify, render_template
+from typing import Dict, List, Any, Tuple
+from collections import deque
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from waitress import serve
 from datetime import datetime, timedelta
 import socket
 import requests
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
+from joblib import parallel_backend
+import analytics
+import schema
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO, 
@@ -26,17 +32,78 @@ logging.basicConfig(level=logging.INFO,
 
 # Global Configuration
 class FirewallConfig:
-    DATABASE = 'firewall_policies.db'
+    DATABASE = schema.DATABASE
     CENTRAL_SERVER = 'http://localhost:5000'
     LOG_DIRECTORY = 'network_logs'
     POLLING_INTERVAL = 60  # seconds
     ANOMALY_THRESHOLD = 0.8  # Confidence level for anomaly detection
+    MODEL_REFIT_GROWTH = 0.1  # Refit the anomaly model after 10% log growth
+    ZSCORE_MAX_ROWS = 1000  # Below this many logs, use z-scores instead of Isolation Forest
+    ZSCORE_THRESHOLD = 3.5  # Robust z-score above which a log is anomalous
+    MODEL_SAMPLE_SIZE = 10_000  # Random log rows used to fit the Isolation Forest
+    PREDICT_CHUNK_SIZE = 50_000  # Log rows scored per predict() call
+    ANALYTICS_MAX_LAG = 0.25  # Max fraction of logs the DuckDB store may be behind
+    BUSY_TIMEOUT = 5  # seconds to wait on a locked database
+    LOG_BUFFER_SIZE = 10_000  # Max network log rows held in memory
+    LOG_FLUSH_BATCH = 500  # Flush early once this many rows are pending
+    LOG_FLUSH_INTERVAL = 1  # seconds between background flushes
+    CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+    SERVER_THREADS = 8  # WSGI worker threads for the management console
+
+# Shared SQL (kept constant so SQLite's statement cache can reuse the parse)
+INSERT_LOG_SQL = (
+    "INSERT INTO network_logs "
+    "(app_name, timestamp, destination, protocol, bytes_sent, bytes_received) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# Identifies a log row, to tell whether a rowid was reused after a cleanup
+LOG_FINGERPRINT_SQL = "SELECT rowid, timestamp, bytes_sent, bytes_received FROM network_logs"
+
+# Database Connection
+def _get_conn():
+    """Open a SQLite connection tuned for concurrent dashboard/monitor access"""
+    conn = sqlite3.connect(FirewallConfig.DATABASE,
+                           timeout=FirewallConfig.BUSY_TIMEOUT,
+                           isolation_level=None,
+                           check_same_thread=False,
+                           cached_statements=FirewallConfig.CACHED_STATEMENTS)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={FirewallConfig.BUSY_TIMEOUT * 1000}")
+    return conn
+
+# Lightweight Anomaly Scoring
+def zscore_outliers(x: np.ndarray, y: np.ndarray,
+                    k: float = FirewallConfig.ZSCORE_THRESHOLD) -> np.ndarray:
+    """Flag rows whose robust (median-based) z-score exceeds k on either feature"""
+    mask = np.zeros(len(x), dtype=bool)
+    for values in (x, y):
+        deviation = np.abs(values - np.median(values))
+        mad = np.median(deviation)
+        if mad > 0:
+            scores = 0.6745 * deviation / mad
+        else:
+            # Mostly-constant data: fall back to the mean absolute deviation
+            mean_ad = deviation.mean()
+            if mean_ad == 0:
+                continue
+            scores = deviation / (1.253314 * mean_ad)
+        mask |= scores > k
+    return mask
+
+def _split_log_rows(rows) -> Tuple[np.ndarray, np.ndarray]:
+    """Split (rowid, bytes_sent, bytes_received) rows into rowids and a float32 feature matrix"""
+    rowids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    # IsolationForest works in float32 internally, so building that directly skips a copy
+    features = np.array([row[1:] for row in rows], dtype=np.float32).reshape(-1, 2)
+    return rowids, features
 
 # Database Initialization
 class DatabaseManager:
     @staticmethod
     def init_db():
-        conn = sqlite3.connect(FirewallConfig.DATABASE)
+        conn = _get_conn()
         cursor = conn.cursor()
         
         # Application Policies Table
@@ -44,25 +111,24 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS app_policies (
                 id TEXT PRIMARY KEY,
                 app_name TEXT,
-                allowed_domains TEXT,
-                allowed_ips TEXT,
-                allowed_protocols TEXT,
                 is_active BOOLEAN
             )
         ''')
         
-        # Network Logs Table
+        # Policy Rules Table (one row per allowed domain/IP/protocol)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS network_logs (
-                id TEXT PRIMARY KEY,
-                app_name TEXT,
-                timestamp DATETIME,
-                destination TEXT,
-                protocol TEXT,
-                bytes_sent INTEGER,
-                bytes_received INTEGER
+            CREATE TABLE IF NOT EXISTS app_policy_rules (
+                policy_id TEXT,
+                kind TEXT,
+                value TEXT
             )
         ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rule_lookup ON app_policy_rules(policy_id, kind, value)"
+        )
+        
+        # Network Logs Table
+        cursor.executescript(schema.CREATE_LOGS_SQL)
         
         conn.commit()
         conn.close()
@@ -73,6 +139,27 @@ class ApplicationFirewallAgent:
         self.agent_id = str(uuid.uuid4())
         DatabaseManager.init_db()
         
+        # Long-lived connection shared by the monitor and dashboard threads
+        self._conn = _get_conn()
+        self._conn_lock = threading.Lock()
+        
+        # Network log rows waiting to be written in one batch
+        self._buffer = deque(maxlen=FirewallConfig.LOG_BUFFER_SIZE)
+        self._buffer_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher_thread = None
+        
+        # Cached anomaly model and the log rows it has already covered
+        self._model = None
+        self._fitted_rowid = 0
+        self._scored_rowid = 0
+        self._scored_row = None  # (rowid, timestamp, bytes_sent, bytes_received) of that row
+        self._anomalies = []
+        self._model_lock = threading.Lock()
+        
+        # Last io_counters sample per application, keyed by PID
+        self._io_samples = {}
+        
     def get_running_processes(self) -> List[Dict[str, Any]]:
         processes = []
         for proc in psutil.process_iter(['pid', 'name', 'exe']):
@@ -88,93 +175,283 @@ class ApplicationFirewallAgent:
     
     def monitor_network_traffic(self, app_name: str):
         """Monitor network traffic for a specific application"""
+        # Logs one row per process with its I/O since the previous call;
+        # the first call for a process only records a baseline sample
         try:
-            connections = [conn for conn in psutil.net_connections() 
-                           if conn.laddr and conn.raddr]
+            pids = {proc.info['pid'] for proc in psutil.process_iter(['pid', 'name'])
+                    if proc.info['name'] == app_name}
+            
+            # One remote connection per process to describe where traffic went
+            connections = {}
+            for conn in psutil.net_connections():
+                if conn.pid in pids and conn.laddr and conn.raddr:
+                    connections.setdefault(conn.pid, conn)
             
-            for conn in connections:
+            # Samples for processes that have exited are dropped with the old dict
+            prev_samples = self._io_samples.get(app_name, {})
+            samples = {}
+            
+            timestamp = int(time.time() * 1000)
+            for pid in pids:
+                try:
+                    counters = psutil.Process(pid).io_counters()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                
+                samples[pid] = counters
+                prev = prev_samples.get(pid)
+                if prev is None:
+                    continue
+                
+                conn = connections.get(pid)
                 log_entry = {
-                    'id': str(uuid.uuid4()),
                     'app_name': app_name,
-                    'timestamp': datetime.now(),
-                    'destination': f"{conn.raddr.ip}:{conn.raddr.port}",
-                    'protocol': conn.type.name if hasattr(conn.type, 'name') else 'Unknown',
-                    'bytes_sent': conn.sent or 0,
-                    'bytes_received': conn.recv or 0
+                    'timestamp': timestamp,
+                    'destination': f"{conn.raddr.ip}:{conn.raddr.port}" if conn else 'Unknown',
+                    'protocol': conn.type.name if conn and hasattr(conn.type, 'name') else 'Unknown',
+                    'bytes_sent': self._io_delta(counters, prev, 'write'),
+                    'bytes_received': self._io_delta(counters, prev, 'read')
                 }
                 
                 self._log_network_activity(log_entry)
+            
+            self._io_samples[app_name] = samples
         except Exception as e:
             logging.error(f"Network monitoring error: {e}")
     
+    @staticmethod
+    def _io_delta(current, previous, direction: str) -> int:
+        """Bytes transferred between two io_counters samples in one direction"""
+        # *_chars (Linux) counts all read/write syscalls, including sockets
+        field = f'{direction}_chars'
+        if not hasattr(current, field):
+            field = f'{direction}_bytes'
+        return max(getattr(current, field) - getattr(previous, field), 0)
+    
     def _log_network_activity(self, log_entry: Dict):
-        """Log network activity to database"""
-        conn = sqlite3.connect(FirewallConfig.DATABASE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO network_logs 
-            (id, app_name, timestamp, destination, protocol, bytes_sent, bytes_received)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            log_entry['id'], 
+        """Queue network activity for the next batched database write"""
+        row = (
             log_entry['app_name'], 
-            str(log_entry['timestamp']),
+            log_entry['timestamp'],
             log_entry['destination'], 
             log_entry['protocol'], 
             log_entry['bytes_sent'], 
             log_entry['bytes_received']
-        ))
-        
-        conn.commit()
-        conn.close()
-    
-    def detect_anomalies(self):
-        """Detect network behavior anomalies using Isolation Forest"""
-        conn = sqlite3.connect(FirewallConfig.DATABASE)
+        )
         
-        # Check if there are enough logs for anomaly detection
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM network_logs")
-        log_count = cursor.fetchone()[0]
+        with self._buffer_lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+            
+            # Start the background writer on first use
+            if self._flusher_thread is None:
+                self._flusher_thread = threading.Thread(target=self._flusher, daemon=True)
+                self._flusher_thread.start()
+                atexit.register(self.flush_logs)
         
-        if log_count < 10:  # Not enough data for meaningful anomaly detection
-            conn.close()
-            return []
+        if pending >= FirewallConfig.LOG_FLUSH_BATCH:
+            self._flush_event.set()
+    
+    def _flusher(self):
+        """Periodically write buffered network logs to the database"""
+        while True:
+            self._flush_event.wait(FirewallConfig.LOG_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            try:
+                self.flush_logs()
+            except sqlite3.Error as e:
+                logging.error(f"Network log flush error: {e}")
+    
+    def flush_logs(self):
+        """Write all buffered network logs in a single transaction"""
+        with self._buffer_lock:
+            if not self._buffer:
+                return
+            rows = self._buffer
+            self._buffer = deque(maxlen=FirewallConfig.LOG_BUFFER_SIZE)
         
-        # Fetch logs and perform anomaly detection
-        df = pd.read_sql_query("SELECT * FROM network_logs", conn)
-        conn.close()
+        with self._conn_lock:
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.executemany(INSERT_LOG_SQL, rows)
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                
+                # Requeue the batch ahead of newer rows so the next flush retries it;
+                # if the buffer overflows, the oldest rows are the ones dropped
+                with self._buffer_lock:
+                    pending = self._buffer
+                    self._buffer = deque(rows, maxlen=FirewallConfig.LOG_BUFFER_SIZE)
+                    self._buffer.extend(pending)
+                raise
+    
+    def detect_anomalies(self):
+        """Detect network behavior anomalies using z-scores or Isolation Forest"""
+        # Make sure buffered logs are visible to the model
+        self.flush_logs()
         
-        try:
-            # Extract features for anomaly detection
-            features = df[['bytes_sent', 'bytes_received']].values
+        # Serialize detection so concurrent dashboard hits don't fit twice
+        with self._model_lock:
+            with self._conn_lock:
+                # Check if there are enough logs for anomaly detection
+                cursor = self._conn.cursor()
+                # Only need to know whether the small-table cutoff is reached, so stop counting there
+                cursor.execute(
+                    "SELECT COUNT(*) FROM (SELECT 1 FROM network_logs LIMIT ?)",
+                    (FirewallConfig.ZSCORE_MAX_ROWS,)
+                )
+                log_count = cursor.fetchone()[0]
+                
+                if log_count < 10:  # Not enough data for meaningful anomaly detection
+                    self._model = None
+                    return []
+                
+                # Small tables are scored with z-scores, much cheaper than fitting a forest
+                use_zscore = log_count < FirewallConfig.ZSCORE_MAX_ROWS
+                
+                cursor.execute(LOG_FINGERPRINT_SQL + " ORDER BY rowid DESC LIMIT 1")
+                latest_row = cursor.fetchone()
+                max_rowid = latest_row[0]
+                
+                # Rowids restart after the table is cleared, so check that the last scored
+                # row is still the same row rather than comparing rowids alone
+                cursor.execute(LOG_FINGERPRINT_SQL + " WHERE rowid = ?", (self._scored_rowid,))
+                table_reset = cursor.fetchone() != self._scored_row
+                
+                # Refit when there is no model, the table was reset, or it grew too much
+                refit = (
+                    self._model is None
+                    or table_reset
+                    or max_rowid > self._fitted_rowid * (1 + FirewallConfig.MODEL_REFIT_GROWTH)
+                )
+                
+                if use_zscore:
+                    # Fetch only the numeric feature columns (plus rowid to look up flagged rows)
+                    cursor.execute(
+                        "SELECT rowid, bytes_sent, bytes_received FROM network_logs WHERE rowid <= ?",
+                        (max_rowid,)
+                    )
+                    rowids, features = _split_log_rows(cursor.fetchall())
+            
+            try:
+                if use_zscore:
+                    self._model = None
+                    mask = zscore_outliers(features[:, 0], features[:, 1])
+                    return self._fetch_log_rows(rowids[mask])
+                
+                if refit:
+                    # Train Isolation Forest
+                    clf = IsolationForest(
+                        contamination=0.1,  # 10% of data considered anomalous
+                        random_state=42,
+                        n_jobs=-1  # Build and score trees on all cores
+                    )
+                    with parallel_backend('threading', n_jobs=-1):
+                        clf.fit(self._training_sample(max_rowid))
+                    
+                    self._model = clf
+                    self._fitted_rowid = max_rowid
+                    self._scored_rowid = 0
+                    self._anomalies = []
+                
+                # Predict anomalies (only rows not scored yet when reusing the model)
+                for rowids, features in self._iter_log_features(self._scored_rowid, max_rowid):
+                    with parallel_backend('threading', n_jobs=-1):
+                        predictions = self._model.predict(features)
+                    self._anomalies.extend(self._fetch_log_rows(rowids[predictions == -1]))
+                
+                self._scored_rowid = max_rowid
+                self._scored_row = latest_row
+                return list(self._anomalies)
+            except Exception as e:
+                # Partially scored state can't be trusted; start over next time
+                self._model = None
+                logging.error(f"Anomaly detection error: {e}")
+                return []
+    
+    def _training_sample(self, max_rowid: int) -> np.ndarray:
+        """Random feature sample for fitting, preferring the DuckDB analytics store"""
+        with self._conn_lock:
+            # The store is checked against this connection to spot a cleared table
+            train = analytics.sample_features(
+                FirewallConfig.MODEL_SAMPLE_SIZE, FirewallConfig.ANALYTICS_MAX_LAG, self._conn
+            )
+            if train is not None:
+                return train
             
-            # Train Isolation Forest
-            clf = IsolationForest(
-                contamination=0.1,  # 10% of data considered anomalous
-                random_state=42
+            # Fit on a random sample so fit cost doesn't grow with the table
+            cursor = self._conn.execute(
+                "SELECT bytes_sent, bytes_received FROM network_logs "
+                "WHERE rowid <= ? ORDER BY RANDOM() LIMIT ?",
+                (max_rowid, FirewallConfig.MODEL_SAMPLE_SIZE)
             )
-            clf.fit(features)
+            return np.array(cursor.fetchall(), dtype=np.float32).reshape(-1, 2)
+    
+    def _iter_log_features(self, since_rowid: int, max_rowid: int):
+        """Yield (rowids, features) for logs in (since_rowid, max_rowid] in bounded chunks"""
+        while since_rowid < max_rowid:
+            with self._conn_lock:
+                cursor = self._conn.execute(
+                    "SELECT rowid, bytes_sent, bytes_received FROM network_logs "
+                    "WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                    (since_rowid, max_rowid, FirewallConfig.PREDICT_CHUNK_SIZE)
+                )
+                rowids, features = _split_log_rows(cursor.fetchall())
             
-            # Predict anomalies
-            predictions = clf.predict(features)
-            anomalies = df[predictions == -1]
+            if not len(rowids):
+                break
             
-            return anomalies.to_dict('records')
-        except Exception as e:
-            logging.error(f"Anomaly detection error: {e}")
-            return []
+            yield rowids, features
+            since_rowid = int(rowids[-1])
+    
+    def _fetch_log_rows(self, rowids) -> List[Dict[str, Any]]:
+        """Load full network log records for the given rowids"""
+        ids = [int(rowid) for rowid in rowids]
+        records = []
+        
+        with self._conn_lock:
+            cursor = self._conn.cursor()
+            # Query in chunks to stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"SELECT * FROM network_logs WHERE rowid IN ({placeholders})", chunk)
+                columns = [col[0] for col in cursor.description]
+                records.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+        
+        return records
 
 # Web Management Console (Flask Application)
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{FirewallConfig.DATABASE}'
 db = SQLAlchemy(app)
 
+# Single agent per process; creating it initializes the database once
+AGENT = ApplicationFirewallAgent()
+
+@app.template_filter('epoch_ms')
+def format_epoch_ms(value):
+    """Render an epoch-milliseconds log timestamp as local time"""
+    if not isinstance(value, (int, float)):
+        return value  # Rows written before timestamps were stored as integers
+    return datetime.fromtimestamp(value / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+# One connection per WSGI worker thread, reused across requests
+_thread_local = threading.local()
+
+def get_db():
+    """Return this worker thread's SQLite connection, opening it on first use"""
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        conn = _thread_local.conn = _get_conn()
+    return conn
+
 @app.route('/')
 def dashboard():
     """Central dashboard for firewall management"""
-    agent = ApplicationFirewallAgent()
+    agent = AGENT
     processes = agent.get_running_processes()
     
     # Safely handle anomaly detection
@@ -193,43 +470,71 @@ def create_policy():
     """Create firewall policy for an application"""
     data = request.json
     
-    conn = sqlite3.connect(FirewallConfig.DATABASE)
+    policy_id = str(uuid.uuid4())
+    rules = (
+        [(policy_id, 'domain', domain) for domain in data.get('allowed_domains', [])] +
+        [(policy_id, 'ip', ip) for ip in data.get('allowed_ips', [])] +
+        [(policy_id, 'protocol', protocol) for protocol in data.get('allowed_protocols', [])]
+    )
+    
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT OR REPLACE INTO app_policies 
-        (id, app_name, allowed_domains, allowed_ips, allowed_protocols, is_active)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        str(uuid.uuid4()),
-        data['app_name'],
-        ','.join(data.get('allowed_domains', [])),
-        ','.join(data.get('allowed_ips', [])),
-        ','.join(data.get('allowed_protocols', [])),
-        data.get('is_active', True)
-    ))
-    
-    conn.commit()
-    conn.close()
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('''
+            INSERT OR REPLACE INTO app_policies 
+            (id, app_name, is_active)
+            VALUES (?, ?, ?)
+        ''', (
+            policy_id,
+            data['app_name'],
+            data.get('is_active', True)
+        ))
+        cursor.executemany('''
+            INSERT INTO app_policy_rules 
+            (policy_id, kind, value)
+            VALUES (?, ?, ?)
+        ''', rules)
+        conn.commit()
+    except Exception:
+        # The connection is reused by later requests, so don't leave it mid-transaction
+        conn.rollback()
+        raise
     
     return jsonify({"status": "success"})
 
 @app.route('/logs/application/<app_name>')
 def get_app_logs(app_name):
     """Retrieve network logs for a specific application"""
-    conn = sqlite3.connect(FirewallConfig.DATABASE)
+    # The body is streamed after the handler returns, so the stream owns its connection
+    conn = _get_conn()
     cursor = conn.cursor()
+    cursor.arraysize = 1000
     
     cursor.execute("SELECT * FROM network_logs WHERE app_name = ?", (app_name,))
-    logs = cursor.fetchall()
     
-    conn.close()
+    def generate():
+        # Emit the JSON array in batches instead of materializing every row
+        try:
+            yield '['
+            first = True
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                for row in rows:
+                    yield ('' if first else ',') + json.dumps(row)
+                    first = False
+            yield ']'
+        finally:
+            conn.close()
     
-    return jsonify(logs)
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 if __name__ == '__main__':
     # Ensure log directory exists
     os.makedirs(FirewallConfig.LOG_DIRECTORY, exist_ok=True)
     
-    # Start the Flask application
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Start the Flask application on a threaded production WSGI server
+    serve(app, host='0.0.0.0', port=5000, threads=FirewallConfig.SERVER_THREADS)
\ No newline at end of file
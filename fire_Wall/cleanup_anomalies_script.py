@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from schema import DATABASE, CREATE_LOGS_SQL
 
 def cleanup_network_logs():
     """
@@ -9,14 +10,14 @@ def cleanup_network_logs():
     """
     try:
         # Connect to the database
-        conn = sqlite3.connect('firewall_policies.db')
+        conn = sqlite3.connect(DATABASE, timeout=5)
+        conn.execute("PRAGMA busy_timeout=5000")
         cursor = conn.cursor()
 
-        # Delete all entries from network_logs table
-        cursor.execute("DELETE FROM network_logs")
+        # Drop and recreate network_logs rather than deleting row by row
+        cursor.executescript("DROP TABLE IF EXISTS network_logs;" + CREATE_LOGS_SQL)
         
-        # Commit changes and close connection
-        conn.commit()
+        # Close connection (executescript has already committed)
         conn.close()
 
         print("Network logs have been successfully cleared.")
@@ -31,7 +32,7 @@ def remove_database_file():
     """
     try:
         # Path to the database file
-        db_path = 'firewall_policies.db'
+        db_path = DATABASE
         
         # Check if file exists before trying to remove
         if os.path.exists(db_path):
@@ -0,0 +1,21 @@
+# Shared Database Schema
+# Side-effect-free so the app and the standalone scripts can all import it.
+
+DATABASE = 'firewall_policies.db'
+
+# Network logs table and its indexes, shared by init_db and log cleanup
+CREATE_LOGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS network_logs (
+        id INTEGER PRIMARY KEY,  -- rowid alias, assigned by SQLite
+        app_name TEXT,
+        timestamp INTEGER,  -- UNIX epoch milliseconds
+        destination TEXT,
+        protocol TEXT,
+        bytes_sent INTEGER,
+        bytes_received INTEGER
+    );
+    
+    -- Indexes for per-application and time-bounded log queries
+    CREATE INDEX IF NOT EXISTS idx_logs_app ON network_logs(app_name);
+    CREATE INDEX IF NOT EXISTS idx_logs_ts ON network_logs(timestamp);
+'''